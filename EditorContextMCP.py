@@ -6,176 +6,418 @@ Exposes editor context via Model Context Protocol (MCP)
 import sublime
 import sublime_plugin
 import threading
+import time
 import json
+import queue
+import socket
 import http.server
 import socketserver
 from datetime import datetime
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import jsonpatch
+except ImportError:
+    jsonpatch = None
+
+
+def json_dumps_bytes(obj, indent=False):
+    """Serialize obj to UTF-8 JSON bytes, using orjson when available"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+    if indent:
+        return json.dumps(obj, indent=2).encode('utf-8')
+    return json.dumps(obj, separators=(",", ":")).encode('utf-8')
+
+
+def json_loads_bytes(data):
+    """Parse JSON from bytes, using orjson when available"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data.decode('utf-8'))
+
+
+def jsonrpc_result_bytes(result_bytes, request_id):
+    """Build an encoded JSON-RPC response around an already encoded result"""
+    return (b'{"jsonrpc":"2.0","result":' + result_bytes +
+            b',"id":' + json_dumps_bytes(request_id) + b'}')
+
+
+def jsonrpc_error_bytes(error_prefix, message, request_id):
+    """Build an encoded JSON-RPC error response from a pre-encoded prefix and a message"""
+    # Strip the quotes from the encoded message, the prefix has already opened the string
+    return (error_prefix + json_dumps_bytes(message)[1:-1] +
+            b'"},"id":' + json_dumps_bytes(request_id) + b'}')
+
+
+# Results for static methods, encoded once at import time
+INITIALIZE_RESULT_BYTES = json_dumps_bytes({
+    "protocolVersion": "2024-11-05",
+    "capabilities": {
+        "resources": {}
+    },
+    "serverInfo": {
+        "name": "sublime-editor-context",
+        "version": "0.1.0"
+    }
+})
+
+RESOURCES_LIST_RESULT_BYTES = json_dumps_bytes({
+    "resources": [
+        {
+            "uri": "sublime-context://state",
+            "name": "Editor State",
+            "description": "Complete editor state with active files per window and other open files",
+            "mimeType": "application/json"
+        }
+    ]
+})
+
+# Error responses, encoded up to the opening quote of the message string
+METHOD_NOT_FOUND_ERROR_PREFIX = (
+    b'{"jsonrpc":"2.0","error":{"code":-32601,"message":"Method not found: ')
+INTERNAL_ERROR_PREFIX = b'{"jsonrpc":"2.0","error":{"code":-32603,"message":"'
+
+EMPTY_BODY_ERROR_BYTES = json_dumps_bytes({
+    "jsonrpc": "2.0",
+    "error": {
+        "code": -32700,
+        "message": "Parse error: empty request body"
+    },
+    "id": None
+})
+
+
+def _escape_pointer(key):
+    """Escape a key for use as a JSON Pointer reference token (RFC 6901)"""
+    return key.replace("~", "~0").replace("/", "~1")
+
+
+def _diff(prev, current, path, ops):
+    """Append JSON Patch operations turning prev into current"""
+    if isinstance(prev, dict) and isinstance(current, dict):
+        for key in prev:
+            if key not in current:
+                ops.append({"op": "remove", "path": path + "/" + _escape_pointer(key)})
+        for key, value in current.items():
+            child_path = path + "/" + _escape_pointer(key)
+            if key not in prev:
+                ops.append({"op": "add", "path": child_path, "value": value})
+            else:
+                _diff(prev[key], value, child_path, ops)
+    elif prev != current:
+        ops.append({"op": "replace", "path": path, "value": current})
+
+
+def make_json_patch(prev, current):
+    """Make an RFC 6902 JSON Patch (as a list of operations) from prev to current"""
+    if jsonpatch is not None:
+        return jsonpatch.make_patch(prev, current).patch
+    ops = []
+    _diff(prev, current, "", ops)
+    return ops
+
+
+class PatchClientCache:
+    """Remembers the last state sent to each patch client, expiring idle clients"""
+
+    def __init__(self, ttl=300.0):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._states = {}
+
+    def swap(self, client_id, state):
+        """Store state for client_id and return the previously stored state, if any"""
+        now = time.monotonic()
+        with self._lock:
+            # Evict clients that haven't read in a while
+            for key in [k for k, (expiry, _) in self._states.items() if expiry < now]:
+                del self._states[key]
+
+            previous = self._states.get(client_id)
+            self._states[client_id] = (now + self.ttl, state)
+
+        return previous[1] if previous else None
+
 
 class EditorContextState:
     """Generates current state of the editor on-demand"""
 
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cache_state = None
+        self._cache_body = None
+        self._cache_expiry = 0.0
+        # Bumped on every invalidation, so one racing a refresh isn't lost
+        self._generation = 0
+        # view id -> (change count, region.a, region.b, selection info), main thread only
+        self._sel_cache = {}
+        # (monotonic time computed, ISO timestamp), refreshed at most once a second
+        self._iso_ts_cache = (0.0, "")
+
+    def invalidate(self):
+        """Drop the cached serialized state so the next read regenerates it"""
+        self._generation += 1
+        self._cache_expiry = 0.0
+
+    def _refresh(self, ttl):
+        """Regenerate the cached state and its serialization if expired (lock must be held)"""
+        if self._cache_body is not None and time.monotonic() < self._cache_expiry:
+            return
+
+        generation = self._generation
+        self._cache_state = self.get_state_snapshot_threadsafe()
+        self._cache_body = json_dumps_bytes(self._cache_state)
+        # Only keep the snapshot if nothing was invalidated while it was being taken
+        if self._generation == generation:
+            self._cache_expiry = time.monotonic() + ttl
+        else:
+            self._cache_expiry = 0.0
+
+    def get_serialized(self, ttl=0.2):
+        """Get the serialized state snapshot, reusing it for up to ttl seconds"""
+        return self.get_cached(ttl)[1]
+
+    def get_cached(self, ttl=0.2):
+        """Get (state dict, serialized state) from the same snapshot (do not mutate the dict)"""
+        with self._lock:
+            self._refresh(ttl)
+            return self._cache_state, self._cache_body
+
+    def get_state_snapshot_threadsafe(self, timeout=1.0):
+        """Get a state snapshot from a background thread by running it on the main thread"""
+        result = []
+        error = []
+        done = threading.Event()
+
+        def snapshot():
+            try:
+                result.append(self.get_state_snapshot())
+            except Exception as e:
+                error.append(e)
+            finally:
+                done.set()
+
+        sublime.set_timeout(snapshot, 0)
+        if not done.wait(timeout):
+            raise RuntimeError("Timed out waiting for editor state")
+        if error:
+            raise error[0]
+        return result[0]
+
+    def _selection_info(self, view, region, sel_cache):
+        """Get selection info for region, reusing the last result if the view is unchanged"""
+        if region is None:
+            return None
+
+        view_id = view.id()
+        key = (view.change_count(), region.a, region.b)
+        cached = self._sel_cache.get(view_id)
+        if cached is not None and cached[:3] == key:
+            sel_cache[view_id] = cached
+            return cached[3]
+
+        if region.a == region.b:
+            # Just cursor position
+            row, col = view.rowcol(region.a)
+            selection_info = {"cursor": {"line": row + 1, "column": col}}
+        else:
+            # Has actual selection
+            start_row, start_col = view.rowcol(region.begin())
+            end_row, end_col = view.rowcol(region.end())
+            selection_info = {
+                "start": {"line": start_row + 1, "column": start_col},
+                "end": {"line": end_row + 1, "column": end_col}
+            }
+
+        sel_cache[view_id] = key + (selection_info,)
+        return selection_info
+
+    def _last_updated(self):
+        """Get the ISO timestamp for lastUpdated, recomputing it at most once a second"""
+        now = time.monotonic()
+        computed_at, timestamp = self._iso_ts_cache
+        if now - computed_at > 1.0:
+            timestamp = datetime.now().isoformat()
+            self._iso_ts_cache = (now, timestamp)
+        return timestamp
+
+    def _collect_files(self, window, seen_files, sel_cache, active_files, other_files):
+        """Append a file object for each saved, not yet seen view in window"""
+        # Get the active view in this window
+        active_view = window.active_view()
+        # Compare buffers rather than views, so a clone of the active view counts as active
+        active_buffer_id = active_view.buffer_id() if active_view else None
+
+        # Get all views in this window, skipping unsaved and already seen files
+        for view in window.views():
+            file_name = view.file_name()
+            if not file_name or file_name in seen_files:
+                continue
+            seen_files.add(file_name)
+
+            # Get selection/cursor info for the first selection in this view
+            sel = view.sel()
+            region = sel[0] if len(sel) else None
+            selection_info = self._selection_info(view, region, sel_cache)
+
+            file_obj = {"path": file_name, "selection": selection_info}
+
+            # Add to appropriate list
+            if view.buffer_id() == active_buffer_id:
+                active_files.append(file_obj)
+            else:
+                other_files.append(file_obj)
+
     def get_state_snapshot(self):
         """Get a snapshot of the current state by querying Sublime directly"""
         active_files = []
         other_files = []
-        project_folders = []
-        seen_files = set()  # Track files we've already processed
-
-        # Iterate through all windows (reversed to get frontmost-first order)
-        for window in reversed(sublime.windows()):
-            # Collect project folders from all windows
-            folders = window.folders()
-            for folder in folders:
-                if folder not in project_folders:
-                    project_folders.append(folder)
-
-            # Get the active view in this window
-            active_view = window.active_view()
-            active_file_in_window = active_view.file_name() if active_view else None
-
-            # Get all views in this window
-            for view in window.views():
-                file_name = view.file_name()
-                if file_name and file_name not in seen_files:
-                    seen_files.add(file_name)
-
-                    # Get selection/cursor info for this view
-                    selection_info = None
-                    selections = view.sel()
-
-                    if selections and len(selections) > 0:
-                        # Get first selection/cursor
-                        region = selections[0]
-
-                        if not region.empty():
-                            # Has actual selection
-                            start_row, start_col = view.rowcol(region.begin())
-                            end_row, end_col = view.rowcol(region.end())
-
-                            selection_info = {
-                                "start": {"line": start_row + 1, "column": start_col},
-                                "end": {"line": end_row + 1, "column": end_col}
-                            }
-                        else:
-                            # Just cursor position
-                            cursor_row, cursor_col = view.rowcol(region.begin())
-                            selection_info = {
-                                "cursor": {"line": cursor_row + 1, "column": cursor_col}
-                            }
-
-                    # Create file object
-                    file_obj = {
-                        "path": file_name,
-                        "selection": selection_info
-                    }
-
-                    # Add to appropriate list
-                    if file_name == active_file_in_window:
-                        active_files.append(file_obj)
-                    else:
-                        other_files.append(file_obj)
+        seen_files = set()  # Track files we've already processed, also catches cloned views
+        sel_cache = {}  # Replaces self._sel_cache, so closed views are dropped
+
+        windows = sublime.windows()
+        if len(windows) == 1:
+            # Common case: no window ordering or cross-window folder dedup needed
+            window = windows[0]
+            project_folders = window.folders()
+            self._collect_files(window, seen_files, sel_cache, active_files, other_files)
+        else:
+            project_folders = []
+            seen_folders = set()  # Companion set for O(1) folder dedup, list keeps order
+
+            # Iterate through all windows (reversed to get frontmost-first order)
+            for window in windows[::-1]:
+                # Collect project folders from all windows
+                for folder in window.folders():
+                    if folder not in seen_folders:
+                        seen_folders.add(folder)
+                        project_folders.append(folder)
+
+                self._collect_files(window, seen_files, sel_cache, active_files, other_files)
+
+        self._sel_cache = sel_cache
 
         return {
             "activeFiles": active_files,
             "otherFiles": other_files,
             "projectFolders": project_folders,
-            "lastUpdated": datetime.now().isoformat()
+            "lastUpdated": self._last_updated()
         }
 
 
 
-# Global state instance
+# Global state instances
 editor_state = EditorContextState()
+patch_clients = PatchClientCache()
+
+
+class EditorContextInvalidateListener(sublime_plugin.EventListener):
+    """Invalidates the cached state whenever the editor state changes"""
+
+    def on_activated(self, view):
+        editor_state.invalidate()
+
+    def on_modified(self, view):
+        editor_state.invalidate()
+
+    def on_selection_modified(self, view):
+        editor_state.invalidate()
+
+    def on_close(self, view):
+        editor_state.invalidate()
+
+    def on_load(self, view):
+        editor_state.invalidate()
 
 
 class MCPRequestHandler(http.server.BaseHTTPRequestHandler):
     """Handles MCP protocol requests over HTTP"""
 
+    # Keep connections alive for back-to-back requests
+    protocol_version = "HTTP/1.1"
+    # Socket timeout while reading a request and writing its response
+    timeout = 10
+    # How long a kept-alive connection may wait for its next request. An idle
+    # connection holds a pool worker, so it is closed quickly to free the worker
+    idle_timeout = 0.25
+
     def log_message(self, format, *args):
         """Suppress default logging"""
         pass
 
+    def handle(self):
+        """Handle requests until the connection closes or sits idle for idle_timeout"""
+        self.close_connection = True
+        self.handle_one_request()
+        while not self.close_connection and self.wait_for_next_request():
+            self.handle_one_request()
+
+    def wait_for_next_request(self):
+        """Wait up to idle_timeout for the next request, return False to close instead"""
+        self.connection.settimeout(self.idle_timeout)
+        try:
+            if not self.rfile.peek(1):
+                return False
+        except socket.timeout:
+            return False
+        self.connection.settimeout(self.timeout)
+        return True
+
+    def send_body(self, status, body, content_type="application/json"):
+        """Send a complete response with a Content-Length so the connection can be reused"""
+        self.send_response(status)
+        self.send_header("Content-type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
     def do_GET(self):
         """Handle GET requests"""
         if self.path == "/health":
-            self.send_response(200)
-            self.send_header("Content-type", "application/json")
-            self.end_headers()
-            self.wfile.write(json.dumps({"status": "ok"}).encode())
+            self.send_body(200, json_dumps_bytes({"status": "ok"}))
             return
 
-        self.send_response(404)
-        self.end_headers()
+        self.send_body(404, b"", content_type="text/plain")
 
     def do_POST(self):
         """Handle MCP JSON-RPC requests"""
-        content_length = int(self.headers.get('Content-Length', 0))
-        body = self.rfile.read(content_length).decode('utf-8')
+        content_length = int(self.headers.get('Content-Length', 0) or 0)
+        if content_length <= 0:
+            self.send_body(400, EMPTY_BODY_ERROR_BYTES)
+            return
+
+        request = None
 
         try:
-            request = json.loads(body)
+            request = json_loads_bytes(self.rfile.read(content_length))
             response = self.handle_mcp_request(request)
-
-            self.send_response(200)
-            self.send_header("Content-type", "application/json")
-            self.end_headers()
-            self.wfile.write(json.dumps(response).encode())
+            if not isinstance(response, bytes):
+                response = json_dumps_bytes(response)
+            self.send_body(200, response)
         except Exception as e:
-            error_response = {
-                "jsonrpc": "2.0",
-                "error": {
-                    "code": -32603,
-                    "message": str(e)
-                },
-                "id": request.get("id") if isinstance(request, dict) else None
-            }
-            self.send_response(500)
-            self.send_header("Content-type", "application/json")
-            self.end_headers()
-            self.wfile.write(json.dumps(error_response).encode())
+            request_id = request.get("id") if isinstance(request, dict) else None
+            self.send_body(500, jsonrpc_error_bytes(INTERNAL_ERROR_PREFIX, str(e), request_id))
 
     def handle_mcp_request(self, request):
-        """Handle MCP protocol request"""
+        """Handle MCP protocol request, returning a response dict or pre-encoded bytes"""
         method = request.get("method")
         params = request.get("params", {})
         request_id = request.get("id")
 
         if method == "initialize":
-            return {
-                "jsonrpc": "2.0",
-                "result": {
-                    "protocolVersion": "2024-11-05",
-                    "capabilities": {
-                        "resources": {}
-                    },
-                    "serverInfo": {
-                        "name": "sublime-editor-context",
-                        "version": "0.1.0"
-                    }
-                },
-                "id": request_id
-            }
+            return jsonrpc_result_bytes(INITIALIZE_RESULT_BYTES, request_id)
 
         elif method == "resources/list":
-            return {
-                "jsonrpc": "2.0",
-                "result": {
-                    "resources": [
-                        {
-                            "uri": "sublime-context://state",
-                            "name": "Editor State",
-                            "description": "Complete editor state with active files per window and other open files",
-                            "mimeType": "application/json"
-                        }
-                    ]
-                },
-                "id": request_id
-            }
+            return jsonrpc_result_bytes(RESOURCES_LIST_RESULT_BYTES, request_id)
 
         elif method == "resources/read":
             uri = params.get("uri")
-            content = self.get_resource_content(uri)
+            mime_type, content = self.get_resource_content(uri, params.get("patch_client"))
 
             return {
                 "jsonrpc": "2.0",
@@ -183,7 +425,7 @@ class MCPRequestHandler(http.server.BaseHTTPRequestHandler):
                     "contents": [
                         {
                             "uri": uri,
-                            "mimeType": "application/json",
+                            "mimeType": mime_type,
                             "text": content
                         }
                     ]
@@ -192,23 +434,116 @@ class MCPRequestHandler(http.server.BaseHTTPRequestHandler):
             }
 
         else:
-            return {
-                "jsonrpc": "2.0",
-                "error": {
-                    "code": -32601,
-                    "message": "Method not found: {}".format(method)
-                },
-                "id": request_id
-            }
+            return jsonrpc_error_bytes(METHOD_NOT_FOUND_ERROR_PREFIX, str(method), request_id)
 
-    def get_resource_content(self, uri):
-        """Get content for a specific resource URI"""
+    def get_resource_content(self, uri, patch_client=None):
+        """Get (mimeType, text) for a specific resource URI
+
+        When patch_client is given and that client has read the state before,
+        the text is a JSON Patch from the state it last received.
+        """
         if uri == "sublime-context://state":
-            return json.dumps(editor_state.get_state_snapshot(), indent=2)
+            if patch_client is None:
+                return "application/json", editor_state.get_serialized().decode('utf-8')
+            if not isinstance(patch_client, str):
+                raise ValueError("patch_client must be a string")
+
+            state, body = editor_state.get_cached()
+            previous = patch_clients.swap(patch_client, state)
+            if previous is None:
+                return "application/json", body.decode('utf-8')
+
+            patch = make_json_patch(previous, state)
+            return "application/json-patch+json", json_dumps_bytes(patch).decode('utf-8')
         else:
             raise ValueError("Unknown resource URI: {}".format(uri))
 
 
+class ReusableTCPServer(socketserver.TCPServer):
+    """TCP server that can rebind its port while old sockets are in TIME_WAIT"""
+    # Must be set on the class: the socket option is applied during bind in __init__
+    allow_reuse_address = True
+    # Listen backlog large enough for bursts of connections from polling clients
+    request_queue_size = socket.SOMAXCONN
+
+
+class ThreadPoolingMixIn:
+    """Mix-in handling requests on a bounded pool of reusable worker threads
+
+    min_workers threads are started up front by init_thread_pool; more are added
+    while queued requests outnumber idle workers, up to max_workers. Beyond that
+    requests queue up.
+    """
+
+    def __init__(self, *args, **kwargs):
+        # Set up before TCPServer.__init__, which calls server_close if bind fails
+        self._requests = queue.Queue()
+        self._pool_lock = threading.Lock()
+        self._max_workers = 0
+        self._workers = 0
+        self._idle_workers = 0
+        self._pending = 0  # Queued requests not yet picked up by a worker
+        super().__init__(*args, **kwargs)
+
+    def init_thread_pool(self, min_workers=2, max_workers=8):
+        """Start the initial worker threads"""
+        with self._pool_lock:
+            self._max_workers = max_workers
+            for _ in range(min_workers):
+                self._add_worker()
+
+    def _add_worker(self):
+        """Start one worker thread (pool lock must be held)"""
+        self._workers += 1
+        thread = threading.Thread(target=self._process_request_worker)
+        thread.daemon = True
+        thread.start()
+
+    def _process_request_worker(self):
+        """Handle queued requests until a None sentinel is received"""
+        while True:
+            with self._pool_lock:
+                self._idle_workers += 1
+            item = self._requests.get()
+            with self._pool_lock:
+                self._idle_workers -= 1
+                if item is not None:
+                    self._pending -= 1
+
+            if item is None:
+                return
+
+            request, client_address = item
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    def process_request(self, request, client_address):
+        """Queue the request for a worker thread"""
+        with self._pool_lock:
+            # Idle workers may already be claimed by queued requests they haven't picked up
+            self._pending += 1
+            if self._pending > self._idle_workers and self._workers < self._max_workers:
+                self._add_worker()
+        self._requests.put((request, client_address))
+
+    def server_close(self):
+        """Close the server socket and stop the worker threads"""
+        super().server_close()
+        with self._pool_lock:
+            workers = self._workers
+            self._workers = 0
+        for _ in range(workers):
+            self._requests.put(None)
+
+
+class ThreadedTCPServer(ThreadPoolingMixIn, ReusableTCPServer):
+    """TCP server handling requests on a pool of worker threads"""
+
+
 class MCPServer:
     """MCP Server running in background thread"""
 
@@ -224,8 +559,8 @@ class MCPServer:
             return
 
         try:
-            self.server = socketserver.TCPServer(("127.0.0.1", self.port), MCPRequestHandler)
-            self.server.allow_reuse_address = True
+            self.server = ThreadedTCPServer(("127.0.0.1", self.port), MCPRequestHandler)
+            self.server.init_thread_pool()
             self.running = True
 
             self.thread = threading.Thread(target=self._run_server)
@@ -245,6 +580,7 @@ class MCPServer:
         """Stop the MCP server"""
         if self.server:
             self.server.shutdown()
+            self.server.server_close()
             self.running = False
             print("EditorContextMCP: Server stopped")
 
@@ -284,4 +620,5 @@ class EditorContextShowStateCommand(sublime_plugin.TextCommand):
             new_view.set_scratch(True)
             new_view.set_syntax_file("Packages/JavaScript/JSON.sublime-syntax")
             # Use run_command to insert text with its own edit object
-            new_view.run_command('append', {'characters': json.dumps(state, indent=2)})
+            text = json_dumps_bytes(state, indent=True).decode('utf-8')
+            new_view.run_command('append', {'characters': text})